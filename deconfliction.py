@@ -1,7 +1,19 @@
+import itertools
+import math
 import numpy as np
 import plotly.graph_objects as go
-from scipy.interpolate import interp1d
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+try:
+    from numba import njit, prange
+    _HAVE_NUMBA = True
+except ImportError:  # Numba is optional; validate_mission falls back to the NumPy path
+    prange = range
+    _HAVE_NUMBA = False
+
+# Segment pairs evaluated per vectorized pass of the NumPy path; bounds its temporary memory
+_PAIR_BATCH_SIZE = 1 << 16
 
 
 ###############################################
@@ -12,36 +24,150 @@ class DroneTrajectory:
 
     def __init__(self, drone_id: str, waypoints, start_time: datetime, speed_mps: float = 5.0):
         self.drone_id = drone_id
-        self.waypoints = np.array(waypoints, dtype=float)  # [[x, y, z], ...]
+        self.waypoints = np.array(waypoints, dtype=np.float32)  # [[x, y, z], ...] in meters
         self.start_time = start_time
         self.speed = speed_mps
 
         self.times, self.total_duration = self._calculate_timings()
 
-        # Interpolation functions for x, y, z over time
-        self.interp_x = interp1d(self.times, self.waypoints[:, 0], kind="linear", fill_value="extrapolate")
-        self.interp_y = interp1d(self.times, self.waypoints[:, 1], kind="linear", fill_value="extrapolate")
-        self.interp_z = interp1d(self.times, self.waypoints[:, 2], kind="linear", fill_value="extrapolate")
+        # Per-segment velocity vectors, so a position is one multiply-add after the segment lookup
+        self._vel = _segment_velocities(*self.segments())
+
+        # Straight-line flights (a single segment) skip the segment search entirely
+        self._simple = len(self.waypoints) == 2
 
     def _calculate_timings(self):
         """Assigns timestamps to each waypoint assuming constant speed between segments."""
-        distances = [0.0]
-        for i in range(1, len(self.waypoints)):
-            dist = np.linalg.norm(self.waypoints[i] - self.waypoints[i - 1])
-            distances.append(distances[-1] + dist)
+        deltas = np.diff(self.waypoints, axis=0)
+        seg_lengths = np.sqrt(np.einsum("ij,ij->i", deltas, deltas))
+        distances = np.concatenate(([0.0], np.cumsum(seg_lengths))).astype(np.float32)
 
-        times = np.array(distances) / self.speed
+        times = distances / np.float32(self.speed)
         return times, times[-1]
 
-    def get_position_at(self, t: float):
-        """Returns [x, y, z] at relative time t seconds from mission start. Returns None if outside window."""
+    def get_position_at(self, t: float, out: np.ndarray = None):
+        """
+        Returns [x, y, z] at relative time t seconds from mission start. Returns None if outside window.
+        Pass a float32 array of shape (3,) as out to fill it in place instead of allocating a new one.
+        """
         if t < 0 or t > self.total_duration:
             return None
-        return np.array([
-            float(self.interp_x(t)),
-            float(self.interp_y(t)),
-            float(self.interp_z(t)),
-        ])
+        if self._simple:
+            i, dt = 0, np.float32(t)
+        else:
+            i, dt = self._locate(t)
+        out = np.multiply(self._vel[i], dt, out=out)
+        return np.add(out, self.waypoints[i], out=out)
+
+    def get_positions_at(self, ts: np.ndarray):
+        """Returns an (N, 3) array of positions at relative times ts. Callers must mask times outside the window."""
+        if self._simple:
+            return self.waypoints[0] + np.multiply.outer(ts, self._vel[0])
+        i, dt = self._locate(ts)
+        return self.waypoints[i] + self._vel[i] * dt[:, None]
+
+    def segments(self):
+        """Returns the linear segments as arrays (t0, t1, p0, p1), one row per segment."""
+        return self.times[:-1], self.times[1:], self.waypoints[:-1], self.waypoints[1:]
+
+    def _locate(self, t):
+        """Finds the segment index for t and the time elapsed within that segment."""
+        i = np.clip(np.searchsorted(self.times, t, side="right") - 1, 0, len(self.times) - 2)
+        return i, t - self.times[i]
+
+
+###############################################
+# Closest-Approach Kernel
+###############################################
+def _scan_conflict(primary_times, primary_wp, primary_vel, other_times, other_wp, other_vel, time_offset, buffer2):
+    """
+    Walks the time-overlapping segment pairs of both trajectories in order and returns the
+    closest approach within the first pair whose squared separation drops below buffer2,
+    as (found, t, location, distance).
+    """
+    p_pos = np.empty(3, dtype=np.float32)
+    d0 = np.empty(3, dtype=np.float32)
+    dv = np.empty(3, dtype=np.float32)
+
+    i = 0
+    j = 0
+    while i < primary_times.shape[0] - 1 and j < other_times.shape[0] - 1:
+        a0 = primary_times[i]
+        a1 = primary_times[i + 1]
+        b0 = other_times[j] + time_offset
+        b1 = other_times[j + 1] + time_offset
+        lo = max(a0, b0)
+        hi = min(a1, b1)
+
+        if lo <= hi:
+            # Separation D(t) = D(lo) + dv * (t - lo) is linear, so |D|^2 has a closed-form minimum
+            for k in range(3):
+                p_pos[k] = primary_wp[i, k] + primary_vel[i, k] * (lo - a0)
+                d0[k] = p_pos[k] - (other_wp[j, k] + other_vel[j, k] * (lo - b0))
+                dv[k] = primary_vel[i, k] - other_vel[j, k]
+
+            dot = d0[0] * dv[0] + d0[1] * dv[1] + d0[2] * dv[2]
+            dv2 = dv[0] * dv[0] + dv[1] * dv[1] + dv[2] * dv[2]
+            s = min(max(-dot / dv2, 0.0), hi - lo) if dv2 > 0.0 else 0.0
+
+            dx = d0[0] + dv[0] * s
+            dy = d0[1] + dv[1] * s
+            dz = d0[2] + dv[2] * s
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 < buffer2:
+                return True, lo + s, p_pos + primary_vel[i] * np.float32(s), np.sqrt(d2)
+
+        # Advance whichever segment ends first
+        if a1 < b1:
+            i += 1
+        else:
+            j += 1
+
+    return False, 0.0, np.zeros(3, dtype=np.float32), 0.0
+
+
+if _HAVE_NUMBA:
+    _scan_conflict = njit(
+        "Tuple((b1,f8,f4[:],f8))(f4[:],f4[:,:],f4[:,:],f4[:],f4[:,:],f4[:,:],f8,f8)",
+        fastmath=True,
+        cache=True,
+    )(_scan_conflict)
+
+
+def _scan_all(primary_times, primary_wp, primary_vel, times, wp, vel, offsets, drone_idxs, time_offsets, buffer2):
+    """
+    Runs _scan_conflict for every candidate flight in parallel over the structure-of-arrays storage.
+    Returns per-candidate (found, t, location, distance) arrays.
+    """
+    n = drone_idxs.shape[0]
+    found = np.zeros(n, dtype=np.bool_)
+    t = np.zeros(n)
+    location = np.zeros((n, 3), dtype=np.float32)
+    distance = np.zeros(n)
+    for c in prange(n):
+        start = offsets[drone_idxs[c]]
+        end = offsets[drone_idxs[c] + 1]
+        found[c], t[c], location[c], distance[c] = _scan_conflict(
+            primary_times, primary_wp, primary_vel,
+            times[start:end], wp[start:end], vel[start:end],
+            time_offsets[c], buffer2,
+        )
+    return found, t, location, distance
+
+
+if _HAVE_NUMBA:
+    _scan_all = njit(
+        "Tuple((b1[:],f8[:],f4[:,:],f8[:]))(f4[:],f4[:,:],f4[:,:],f4[:],f4[:,:],f4[:,:],i4[:],i8[:],f8[:],f8)",
+        parallel=True,
+        fastmath=True,
+        cache=True,
+    )(_scan_all)
+
+
+def _segment_velocities(t0, t1, p0, p1):
+    """Returns per-segment velocity vectors; zero-length segments stand still."""
+    span = (t1 - t0)[:, None]
+    return np.divide(p1 - p0, span, out=np.zeros_like(p0), where=span > 0)
 
 
 ###############################################
@@ -50,13 +176,206 @@ class DroneTrajectory:
 class DeconflictionService:
     """Central authority to verify whether a primary flight is safe."""
 
-    def __init__(self, spatial_buffer: float = 5.0, temporal_buffer: float = 10.0):
-        self.spatial_buffer = spatial_buffer    # meters
+    def __init__(self, spatial_buffer: float = 5.0, temporal_buffer: float = 10.0, index_cell_size: float = 100.0):
         self.temporal_buffer = temporal_buffer  # seconds (currently implicit via time alignment)
-        self.scheduled_flights = []
+        # Meters per cell of the segment grid index. Segments are indexed in cell-length pieces, so a
+        # segment costs about (length / cell) * (1 + 2 * buffer / cell)^3 cells; keep cells >= buffer
+        self.index_cell_size = index_cell_size
+        self._flights = []
+
+        # Structure-of-arrays copy of all scheduled flights; drone d owns rows offsets[d]:offsets[d + 1].
+        # Rebuilt lazily by _pack() so adding N flights stays linear
+        self._wp = np.empty((0, 3), dtype=np.float32)
+        self._times = np.empty(0, dtype=np.float32)
+        self._vel = np.empty((0, 3), dtype=np.float32)  # segment velocity per row; zero on each drone's last row
+        self._offsets = np.zeros(1, dtype=np.int32)
+        self._epoch = None  # start time of the first scheduled flight
+        self._start_offsets = np.empty(0)  # seconds from the epoch to each flight's start
+        self._packed = True
+
+        self.spatial_buffer = spatial_buffer  # meters; setting it (re)builds the segment index
+
+    @property
+    def scheduled_flights(self):
+        """Scheduled flights in insertion order; use add_scheduled_flight to add one."""
+        return tuple(self._flights)
+
+    @property
+    def spatial_buffer(self):
+        """Minimum allowed separation between drones, in meters."""
+        return self._spatial_buffer
+
+    @spatial_buffer.setter
+    def spatial_buffer(self, value: float):
+        # Indexed segment boxes are inflated by the buffer, so changing it means re-indexing
+        self._spatial_buffer = value
+        self._buffer_sq = np.float32(value) ** 2  # separations are compared squared
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        """Re-indexes every scheduled flight with the current spatial buffer."""
+        # Uniform grid over scheduled segments: cell -> [(drone_idx, seg_idx), ...]
+        self._index = defaultdict(list)
+        self._segment_boxes = []  # per drone: (mins, maxs) of buffer-inflated segment boxes
+        for drone_idx, trajectory in enumerate(self._flights):
+            self._index_flight(drone_idx, trajectory)
 
     def add_scheduled_flight(self, trajectory: DroneTrajectory):
-        self.scheduled_flights.append(trajectory)
+        drone_idx = len(self._flights)
+        self._flights.append(trajectory)
+        self._packed = False
+        if self._epoch is None:
+            self._epoch = trajectory.start_time
+        self._index_flight(drone_idx, trajectory)
+
+    def _pack(self):
+        """Consolidates the structure-of-arrays storage if flights were added since the last call."""
+        if self._packed:
+            return
+        last_row = np.zeros((1, 3), dtype=np.float32)
+        self._wp = np.concatenate([f.waypoints for f in self._flights])
+        self._times = np.concatenate([f.times for f in self._flights])
+        self._vel = np.concatenate([v for f in self._flights for v in (f._vel, last_row)])
+        self._offsets = np.concatenate(([0], np.cumsum([len(f.times) for f in self._flights]))).astype(np.int32)
+        self._start_offsets = np.array([(f.start_time - self._epoch).total_seconds() for f in self._flights])
+        self._packed = True
+
+    def _index_flight(self, drone_idx: int, trajectory: DroneTrajectory):
+        """Inserts the buffer-inflated box of every segment of a flight into the grid index."""
+        _, _, p0, p1 = trajectory.segments()
+        mins = np.minimum(p0, p1) - self.spatial_buffer
+        maxs = np.maximum(p0, p1) + self.spatial_buffer
+        self._segment_boxes.append((mins, maxs))
+        for seg_idx in range(len(mins)):
+            for cell in self._segment_cells(p0[seg_idx], p1[seg_idx], self.spatial_buffer):
+                self._index[cell].append((drone_idx, seg_idx))
+
+    def _segment_cells(self, p0, p1, pad: float):
+        """
+        Returns the grid cells covered by segment p0-p1 inflated by pad. Long segments are split into
+        pieces no longer than a cell, so the count grows with segment length rather than box volume.
+        """
+        n_pieces = max(1, math.ceil(math.dist(p0, p1) / self.index_cell_size))
+        ends = p0 + np.outer(np.linspace(0, 1, n_pieces + 1), p1 - p0)
+        cells = set()
+        for a, b in zip(ends[:-1], ends[1:]):
+            cells.update(self._grid_cells(np.minimum(a, b) - pad, np.maximum(a, b) + pad))
+        return cells
+
+    def _grid_cells(self, lo, hi):
+        """Yields every grid cell touched by the box [lo, hi]."""
+        first = np.floor(lo / self.index_cell_size).astype(int)
+        last = np.floor(hi / self.index_cell_size).astype(int)
+        return itertools.product(*(range(a, b + 1) for a, b in zip(first, last)))
+
+    def _candidate_flights(self, primary_mission: DroneTrajectory):
+        """Returns indices of scheduled flights with a segment box touching any primary segment."""
+        candidates = set()
+        _, _, p0, p1 = primary_mission.segments()
+        for a, b in zip(p0, p1):
+            lo = np.minimum(a, b)
+            hi = np.maximum(a, b)
+            for cell in self._segment_cells(a, b, 0.0):
+                for drone_idx, seg_idx in self._index.get(cell, ()):
+                    if drone_idx in candidates:
+                        continue
+                    mins, maxs = self._segment_boxes[drone_idx]
+                    if np.all(mins[seg_idx] <= hi) and np.all(maxs[seg_idx] >= lo):
+                        candidates.add(drone_idx)
+        return candidates
+
+    def _first_conflicts_numba(self, primary_mission: DroneTrajectory, drone_idxs, time_offsets):
+        """Runs the compiled closest-approach kernel over all candidate flights in parallel."""
+        found, t, location, separation = _scan_all(
+            primary_mission.times, primary_mission.waypoints, primary_mission._vel,
+            self._times, self._wp, self._vel, self._offsets,
+            drone_idxs, time_offsets, self._buffer_sq,
+        )
+        return {drone_idxs[c]: (t[c], location[c], separation[c]) for c in np.flatnonzero(found)}
+
+    def _first_conflicts_numpy(self, primary_mission: DroneTrajectory, drone_idxs, time_offsets):
+        """
+        Checks each primary segment against the segments of all candidate flights at once.
+        Returns {drone_idx: (t, location, separation)} for the first conflict of each flight.
+        """
+        # Gather every candidate segment into flat arrays, grouped by flight in time order
+        starts = self._offsets[drone_idxs]
+        ends = self._offsets[drone_idxs + 1]
+        seg_counts = ends - starts - 1
+        rows = np.concatenate([np.arange(start, end - 1) for start, end in zip(starts, ends)])
+        seg_flight = np.repeat(np.arange(len(drone_idxs)), seg_counts)
+        seg_offset = np.repeat(time_offsets, seg_counts).astype(np.float32)
+
+        ot0 = self._times[rows]
+        ot1 = self._times[rows + 1]
+        op0 = self._wp[rows]
+        o_vel = self._vel[rows]
+        o_speed = np.sqrt(np.einsum("ij,ij->i", o_vel, o_vel))
+        ot0 = ot0 + seg_offset
+        ot1 = ot1 + seg_offset
+
+        pt0, pt1, pp0, _ = primary_mission.segments()
+        p_vel = primary_mission._vel
+        p_speed = np.sqrt(np.einsum("ij,ij->i", p_vel, p_vel))
+        buffer = np.float32(self.spatial_buffer)
+
+        first_conflicts = {}
+        unresolved = np.ones(len(drone_idxs), dtype=bool)
+        # Primary segments are visited in time order, so the first hit per flight is its first conflict
+        i0 = 0
+        while i0 < len(pt0):
+            # Broadcast a block of primary segments against every live segment as one 2D batch
+            i1 = min(len(pt0), i0 + max(1, _PAIR_BATCH_SIZE // len(ot0)))
+            lo = np.maximum(pt0[i0:i1, None], ot0[None, :])
+            hi = np.minimum(pt1[i0:i1, None], ot1[None, :])
+            i, k = np.nonzero(lo <= hi)  # row-major, so pairs stay in time order per flight
+            lo = lo[i, k]
+            hi = hi[i, k]
+            i += i0
+            i0 = i1
+            if len(k) == 0:
+                continue
+
+            # Relative-speed bound: by the end of the overlap neither drone can have moved further
+            # from its segment start than speed * elapsed, so pairs starting far enough apart are safe
+            reach = buffer + p_speed[i] * (hi - pt0[i]) + o_speed[k] * (hi - ot0[k])
+            start_gap = pp0[i] - op0[k]
+            near = np.einsum("ij,ij->i", start_gap, start_gap) < reach * reach
+            i, k, lo, hi = i[near], k[near], lo[near], hi[near]
+            if len(k) == 0:
+                continue
+
+            # Separation D(t) = D(lo) + dv * (t - lo) is linear, so |D|^2 has a closed-form minimum
+            p_lo = pp0[i] + p_vel[i] * (lo - pt0[i])[:, None]
+            d0 = p_lo - (op0[k] + o_vel[k] * (lo - ot0[k])[:, None])
+            dv = p_vel[i] - o_vel[k]
+
+            dot = np.einsum("ij,ij->i", d0, dv)
+            dv2 = np.einsum("ij,ij->i", dv, dv)
+            s = np.divide(-dot, dv2, out=np.zeros_like(dv2), where=dv2 > 0)
+            s = np.clip(s, 0, hi - lo)
+
+            gap = d0 + dv * s[:, None]
+            d2 = np.einsum("ij,ij->i", gap, gap)
+            hits = np.flatnonzero(d2 < self._buffer_sq)
+            if len(hits) == 0:
+                continue
+
+            # Segments are grouped by flight in time order, so np.unique picks each flight's earliest hit
+            flights, first = np.unique(seg_flight[k[hits]], return_index=True)
+            for flight, h in zip(flights, hits[first]):
+                first_conflicts[drone_idxs[flight]] = (lo[h] + s[h], p_lo[h] + p_vel[i[h]] * s[h], math.sqrt(d2[h]))
+            unresolved[flights] = False
+            if not unresolved.any():
+                break  # Every candidate already has its first conflict
+
+            # Drop the segments of resolved flights so later passes only touch live ones
+            live = unresolved[seg_flight]
+            seg_flight, ot0, ot1, op0, o_vel, o_speed = (
+                a[live] for a in (seg_flight, ot0, ot1, op0, o_vel, o_speed)
+            )
+
+        return first_conflicts
 
     def validate_mission(self, primary_mission: DroneTrajectory):
         """
@@ -74,32 +393,42 @@ class DeconflictionService:
                 }, ...
             ])
         """
-        conflicts = []
+        drone_idxs, time_offsets = self._candidates(primary_mission)
 
-        # Sample flight at 0.5s resolution
-        check_intervals = np.arange(0, primary_mission.total_duration, 0.5)
+        first_conflicts = {}
+        if len(drone_idxs):
+            scan = self._first_conflicts_numba if _HAVE_NUMBA else self._first_conflicts_numpy
+            first_conflicts = scan(primary_mission, drone_idxs, time_offsets)
 
-        for other in self.scheduled_flights:
-            # Align global clock
-            time_offset = (other.start_time - primary_mission.start_time).total_seconds()
+        return self._report(first_conflicts)
 
-            for t in check_intervals:
-                p_pos = primary_mission.get_position_at(t)
-                o_pos = other.get_position_at(t - time_offset)
-
-                if p_pos is None or o_pos is None:
-                    continue
-
-                separation = np.linalg.norm(p_pos - o_pos)
-
-                if separation < self.spatial_buffer:
-                    conflicts.append({
-                        "other_drone": other.drone_id,
-                        "time_relative": round(t, 2),
-                        "location": p_pos.tolist(),
-                        "distance": round(separation, 2)
-                    })
-                    break  # First conflict per drone is enough
+    def _candidates(self, primary_mission: DroneTrajectory):
+        """
+        Returns (drone_idxs, time_offsets) of the flights with a segment near the primary path and
+        an overlapping time window; time_offsets are their start times relative to the primary's.
+        """
+        drone_idxs = np.array(sorted(self._candidate_flights(primary_mission)), dtype=np.int64)
+        if len(drone_idxs) == 0:
+            return drone_idxs, np.empty(0)
+        self._pack()
+
+        # Align global clock; start times are kept as float offsets from the service epoch
+        primary_offset = (primary_mission.start_time - self._epoch).total_seconds()
+        time_offsets = self._start_offsets[drone_idxs] - primary_offset
+        durations = self._times[self._offsets[drone_idxs + 1] - 1]
+        in_window = (time_offsets <= primary_mission.total_duration) & (time_offsets + durations >= 0)
+        return drone_idxs[in_window], time_offsets[in_window]
+
+    def _report(self, first_conflicts):
+        """Builds the validate_mission result from {drone_idx: (t, location, separation)}."""
+        conflicts = []
+        for drone_idx, (t, location, separation) in sorted(first_conflicts.items()):
+            conflicts.append({
+                "other_drone": self._flights[drone_idx].drone_id,
+                "time_relative": round(float(t), 2),
+                "location": np.round(location.astype(np.float64), 2).tolist(),
+                "distance": round(float(separation), 2)
+            })
 
         if not conflicts:
             return "CLEAR", []
@@ -143,6 +472,43 @@ def _run_basic_tests():
     assert status == "CONFLICT", "Expected conflict not detected"
     assert any(c["other_drone"] == "Test_Conflict" for c in conflicts), "Conflict drone not reported"
 
+    # Numba and NumPy scans must agree on multi-segment flights with offset start times
+    service = DeconflictionService(spatial_buffer=10.0)
+    service.add_scheduled_flight(DroneTrajectory(
+        "Test_Late_Crossing",
+        waypoints=[[100, 30, 20], [70, 30, 20], [0, 30, 20]],
+        start_time=now + timedelta(seconds=10),
+    ))
+    service.add_scheduled_flight(DroneTrajectory(
+        "Test_Early_Dogleg",
+        waypoints=[[0, -40, 20], [0, 40, 25], [60, 60, 20]],
+        start_time=now - timedelta(seconds=6),
+    ))
+    service.add_scheduled_flight(DroneTrajectory(
+        "Test_Parallel_Safe",
+        waypoints=[[0, 0, 60], [60, 0, 60], [60, 60, 60]],
+        start_time=now + timedelta(seconds=2),
+    ))
+
+    primary = DroneTrajectory(
+        "Primary_Loop",
+        waypoints=[[0, 0, 20], [60, 0, 20], [60, 60, 20], [0, 60, 20]],
+        start_time=now,
+    )
+
+    drone_idxs, time_offsets = service._candidates(primary)
+    status_numba, conflicts_numba = service._report(service._first_conflicts_numba(primary, drone_idxs, time_offsets))
+    status_numpy, conflicts_numpy = service._report(service._first_conflicts_numpy(primary, drone_idxs, time_offsets))
+
+    assert status_numba == status_numpy == "CONFLICT", "Scan paths disagree on status"
+    assert [c["other_drone"] for c in conflicts_numba] == [c["other_drone"] for c in conflicts_numpy], \
+        "Scan paths report different drones"
+    assert len(conflicts_numba) == 2, "Expected both crossing drones to be reported"
+    for a, b in zip(conflicts_numba, conflicts_numpy):
+        assert abs(a["time_relative"] - b["time_relative"]) < 0.05, "Scan paths disagree on conflict time"
+        assert np.allclose(a["location"], b["location"], atol=0.05), "Scan paths disagree on conflict location"
+        assert abs(a["distance"] - b["distance"]) < 0.05, "Scan paths disagree on separation"
+
     print("Sanity tests passed ✔️")
 
 
@@ -190,7 +556,7 @@ def run_demo_scenarios():
 
     def add_traj_to_plot(traj: DroneTrajectory, color, name, is_primary=False):
         t_steps = np.linspace(0, traj.total_duration, 50)
-        path = np.array([traj.get_position_at(t) for t in t_steps])
+        path = traj.get_positions_at(t_steps)
         fig.add_trace(go.Scatter3d(
             x=path[:, 0], y=path[:, 1], z=path[:, 2],
             mode='lines',